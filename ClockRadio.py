@@ -5,55 +5,64 @@
 #   - A third mute (during the 2nd snoozed ring) silences alarm for the rest of the day
 #   - Turning Alarm Enable switch (GP19) OFF cancels any ringing/snooze immediately
 #   - Resets automatically at the next day rollover
+# Copy index.html (web UI page) to the CIRCUITPY root alongside this file.
 
 import busio
 import board
 from TEA5767 import Radio
-import digitalio
+import keypad
 import time
 from adafruit_ht16k33.segments import Seg7x4
 import os
 import wifi
 import socketpool
-from adafruit_httpserver import Server, Request, Response, JSONResponse
+from adafruit_httpserver import Server, Request, Response, FileResponse
 
 # ----------------------------
 # Init Controls & Devices
 # ----------------------------
-but_mute = digitalio.DigitalInOut(board.GP14)
-but_mute.switch_to_input(pull=digitalio.Pull.UP)
-
-stn_up = digitalio.DigitalInOut(board.GP15)
-stn_up.switch_to_input(pull=digitalio.Pull.UP)
-
-stn_down = digitalio.DigitalInOut(board.GP13)
-stn_down.switch_to_input(pull=digitalio.Pull.UP)
-
-but_hours = digitalio.DigitalInOut(board.GP16)
-but_hours.switch_to_input(pull=digitalio.Pull.UP)
-
-but_mins = digitalio.DigitalInOut(board.GP17)
-but_mins.switch_to_input(pull=digitalio.Pull.UP)
-
-sw_alarm = digitalio.DigitalInOut(board.GP18)
-sw_alarm.switch_to_input(pull=digitalio.Pull.UP)
-
-sw_alarm_enable = digitalio.DigitalInOut(board.GP19)
-sw_alarm_enable.switch_to_input(pull=digitalio.Pull.UP)
+# Buttons and switches are all scanned (and debounced) by keypad in one pass;
+# key numbers follow pin order. Switch levels are tracked from their events.
+keys = keypad.Keys(
+    (board.GP14, board.GP15, board.GP13, board.GP16, board.GP17, board.GP18, board.GP19),
+    value_when_pressed=False,
+    pull=True,
+)
+KEY_MUTE      = 0
+KEY_STN_UP    = 1
+KEY_STN_DOWN  = 2
+KEY_HOURS     = 3
+KEY_MINS      = 4
+KEY_SW_ALARM  = 5  # alarm set/show switch (GP18)
+KEY_SW_ENABLE = 6  # alarm enable switch (GP19)
+
+alarm_set_mode = False  # GP18 ON: display and adjust the alarm time
+alarm_enabled = False   # GP19 ON: alarm armed
 
 # ----------------------------
 # I2C + Radio + Display
 # ----------------------------
-i2c = busio.I2C(board.GP5, board.GP4, frequency=400000)
-
-station = 99.9
+# TEA5767 and HT16K33 are both Fast-mode parts (400 kHz max); don't raise this
+I2C_FREQUENCY = 400000
+i2c = busio.I2C(board.GP5, board.GP4, frequency=I2C_FREQUENCY)
+
+# Station is kept as integer tenths of a MHz so stepping needs no float rounding
+STATION_MIN = 880   # 88.0 MHz
+STATION_MAX = 1080  # 108.0 MHz
+station = 999       # 99.9 MHz
 mute = 0  # 0 = unmuted, 1 = muted
-radio = Radio(i2c, freq=station)
+radio = Radio(i2c, freq=station / 10)
+# Resolve the mute call once; drivers without mute() get a no-op
+set_mute = getattr(radio, "mute", lambda muted: None)
 
 display = Seg7x4(i2c, address=0x71)
-display.brightness = 0.4
+display.auto_write = False  # render into the buffer, ship it with one show() per frame
 BRIGHT_DIM = 0.1
 BRIGHT_ON  = 0.6
+display.brightness = BRIGHT_DIM  # raised when the enable switch reports ON
+
+# "00".."59", so redraws don't format a new string each tick
+TWO_DIGITS = tuple("%02d" % i for i in range(60))
 
 # ----------------------------
 # Clock / Alarm Variables
@@ -62,20 +71,23 @@ SET_HOUR   = 12
 SET_MINUTE = 0
 SET_SECOND = 0
 USE_12_HOUR = True
-base_seconds = (SET_HOUR * 3600) + (SET_MINUTE * 60) + SET_SECOND
 
 ALARM_HOUR   = 6
 ALARM_MINUTE = 30
 ALARM_SECOND = 0
 alarm_seconds = (ALARM_HOUR * 3600) + (ALARM_MINUTE * 60) + ALARM_SECOND
 
-start_monotonic = time.monotonic()
+NS_PER_S = 1_000_000_000
+
+# monotonic_ns() reading at midnight of day 0; time of day and day index both derive from it
+clock_epoch_ns = time.monotonic_ns() - ((SET_HOUR * 3600) + (SET_MINUTE * 60) + SET_SECOND) * NS_PER_S
 
 # ----------------------------
 # Snooze State (NEW)
 # ----------------------------
 SNOOZE_SECONDS = 9 * 60
 MAX_SNOOZES = 2
+RING_WINDOW_SECONDS = 120  # a ring target still fires if the loop stalled past it by less than this
 
 alarm_ringing = False          # True only while currently ringing
 initial_fired_today = False    # True once the "main" alarm time has rung today
@@ -83,7 +95,18 @@ snooze_count = 0               # number of snoozes used today (0..2)
 snooze_target = None           # seconds since midnight for next snoozed ring, or None
 alarm_done_for_day = False     # True after user "dismisses" (third mute), prevents further rings
 
-prev_current_seconds = None    # for day rollover detection
+last_day = 0                   # day index since clock_epoch_ns, for rollover detection
+
+# ----------------------------
+# Display Cache
+# ----------------------------
+shown_frame = -1               # mode/hours/minutes currently on the display (-1 = redraw)
+shown_colon = None             # colon state currently on the display
+
+TICK_NS = 500_000_000          # clock/alarm housekeeping period
+STATION_HOLD_NS = 500_000_000  # how long a station readout stays up
+next_tick_ns = 0               # monotonic_ns deadline for the next housekeeping tick
+IDLE_SLEEP = 0.005             # pause between loop passes while no alarm is ringing
 
 # ----------------------------
 # WiFi + Web Server
@@ -92,7 +115,9 @@ ssid = os.getenv("CIRCUITPY_WIFI_SSID")
 pw   = os.getenv("CIRCUITPY_WIFI_PASSWORD")
 
 wifi.radio.connect(ssid, pw)
-print("IP:", wifi.radio.ipv4_address)
+IP_STR = str(wifi.radio.ipv4_address)  # fixed for the session
+IP_BYTES = IP_STR.encode()
+print("IP:", IP_STR)
 
 pool = socketpool.SocketPool(wifi.radio)
 server = Server(pool, "/")
@@ -102,16 +127,17 @@ server = Server(pool, "/")
 # =========================================================
 
 def get_current_seconds():
-    elapsed = int(time.monotonic() - start_monotonic)
-    return (base_seconds + elapsed) % 86400
+    return ((time.monotonic_ns() - clock_epoch_ns) // NS_PER_S) % 86400
 
 def set_clock(hh, mm, ss=0):
-    global base_seconds, start_monotonic
+    """Set the time of day, staying on the current day (no rollover)."""
+    global clock_epoch_ns
     hh = int(hh) % 24
     mm = int(mm) % 60
     ss = int(ss) % 60
-    base_seconds = (hh * 3600) + (mm * 60) + ss
-    start_monotonic = time.monotonic()
+    now_ns = time.monotonic_ns()
+    day = (now_ns - clock_epoch_ns) // (86400 * NS_PER_S)
+    clock_epoch_ns = now_ns - ((day * 86400) + (hh * 3600) + (mm * 60) + ss) * NS_PER_S
 
 def set_alarm(hh, mm, ss=0):
     global alarm_seconds
@@ -120,50 +146,33 @@ def set_alarm(hh, mm, ss=0):
     ss = int(ss) % 60
     alarm_seconds = (hh * 3600) + (mm * 60) + ss
 
-def increment_hour():
-    global base_seconds, start_monotonic
-    current = get_current_seconds()
-    current = (current + 3600) % 86400
-    base_seconds = current
-    start_monotonic = time.monotonic()
-    time.sleep(0.25)
-
-def increment_minute():
-    global base_seconds, start_monotonic
-    current = get_current_seconds()
-    current = (current + 60) % 86400
-    base_seconds = current
-    start_monotonic = time.monotonic()
-    time.sleep(0.25)
-
-def increment_alarm_hour():
-    global alarm_seconds
-    alarm_seconds = (alarm_seconds + 3600) % 86400
-    time.sleep(0.25)
-
-def increment_alarm_minute():
-    global alarm_seconds
-    alarm_seconds = (alarm_seconds + 60) % 86400
-    time.sleep(0.25)
+def bump_time(alarm, delta):
+    """Advance the alarm time (alarm=True) or the clock by delta seconds, wrapping at midnight."""
+    global clock_epoch_ns, alarm_seconds
+    if alarm:
+        alarm_seconds = (alarm_seconds + delta) % 86400
+    else:
+        # Moving the epoch back advances the clock; passing midnight starts a new day
+        clock_epoch_ns -= delta * NS_PER_S
 
 def apply_station(new_station):
-    """Hard-set the radio to new_station MHz (most compatible approach)."""
-    global radio, mute
-    radio = Radio(i2c, freq=new_station)
-    try:
-        radio.mute(bool(mute))
-    except Exception:
-        pass
-    display.print(f"{new_station:5.1f}")
-    time.sleep(0.2)
+    """Retune the existing radio to new_station (tenths of MHz) with a single control-byte write."""
+    global shown_frame, next_tick_ns
+    radio.set_frequency(new_station / 10)
+    set_mute(bool(mute))
+    display.print(f"{new_station / 10:5.1f}")
+    display.show()
+    shown_frame = -1  # station readout replaced the clock digits
+    next_tick_ns = time.monotonic_ns() + STATION_HOLD_NS  # keep it up before the clock redraws
 
 def step_station(step):
+    """Move step tenths of a MHz, wrapping around the 88.0-108.0 band."""
     global station
-    new_station = round(station + step, 1)
-    if new_station < 88.0:
-        new_station = 108.0
-    elif new_station > 108.0:
-        new_station = 88.0
+    new_station = station + step
+    if new_station < STATION_MIN:
+        new_station = STATION_MAX
+    elif new_station > STATION_MAX:
+        new_station = STATION_MIN
     station = new_station
     apply_station(station)
     return station
@@ -171,22 +180,20 @@ def step_station(step):
 def start_alarm_ring():
     """Force alarm audio ON (unmuted)."""
     global alarm_ringing, mute
-    try:
-        radio.mute(False)
-    except Exception:
-        pass
+    set_mute(False)
     mute = 0
     alarm_ringing = True
 
 def stop_alarm_audio_mute():
     """Mute radio (used when snoozing/dismissing)."""
     global mute
-    try:
-        radio.mute(True)
-    except Exception:
-        pass
+    set_mute(True)
     mute = 1
 
+def ring_due(cur, target):
+    """True once cur reaches target (seconds since midnight), within the catch-up window."""
+    return 0 <= cur - target < RING_WINDOW_SECONDS
+
 def cancel_alarm_process_for_today():
     """Stop ringing/snoozes for the rest of the day."""
     global alarm_ringing, snooze_target, alarm_done_for_day
@@ -231,30 +238,35 @@ def handle_mute_press():
             snooze_target = (now + SNOOZE_SECONDS) % 86400
             alarm_ringing = False
             stop_alarm_audio_mute()
-            time.sleep(0.2)
             return
         else:
             # Already used 2 snoozes; third mute dismisses for day
             cancel_alarm_process_for_today()
-            time.sleep(0.2)
             return
 
     # Normal toggle if not ringing
     global mute
     mute = 0 if mute else 1
-    try:
-        radio.mute(bool(mute))
-    except Exception:
-        pass
-    time.sleep(0.2)
+    set_mute(bool(mute))
+
+def show_frame(frame, hours, minutes, colon):
+    """Write digits/colon to the display only when they differ from what is shown."""
+    global shown_frame, shown_colon
+    if frame == shown_frame and colon == shown_colon:
+        return
+    if frame != shown_frame:
+        display.print(TWO_DIGITS[hours] + TWO_DIGITS[minutes])
+        shown_frame = frame
+    display.colon = colon
+    shown_colon = colon
+    display.show()
 
 def update_clock():
     # If alarm switch is ON, show alarm time (24-hour)
-    if sw_alarm.value == 0:
+    if alarm_set_mode:
         hours = alarm_seconds // 3600
         minutes = (alarm_seconds % 3600) // 60
-        display.print(f"{hours:02d}{minutes:02d}")
-        display.colon = True
+        show_frame(10000 + hours * 100 + minutes, hours, minutes, True)
         return
 
     current = get_current_seconds()
@@ -271,225 +283,147 @@ def update_clock():
     else:
         hours = hours24
 
-    display.print(f"{hours:02d}{minutes:02d}")
-
     if USE_12_HOUR and is_pm:
-        display.colon = True
+        colon = True
     else:
-        display.colon = (seconds % 2) == 0
+        colon = (seconds % 2) == 0
+
+    show_frame(hours * 100 + minutes, hours, minutes, colon)
 
 # =========================================================
 # Web UI
 # =========================================================
 
+# Shared response bodies and content types
+OK_BYTES = b"OK"
+MSG_MISSING = b"Missing hh or mm"
+MSG_BAD = b"Bad request"
+CT_PLAIN = "text/plain"
+CT_JSON = "application/json"
+
 @server.route("/", methods=("GET",))
 def index(request: Request):
-    html = """<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1">
-  <title>Clock Radio</title>
-  <style>
-    body { font-family: sans-serif; margin: 16px; }
-    .card { border: 1px solid #ccc; border-radius: 12px; padding: 12px; margin-bottom: 12px; }
-    .row { display: flex; gap: 10px; flex-wrap: wrap; align-items: center; }
-    .btn { padding: 12px 14px; border-radius: 12px; border: 1px solid #333; background: #f4f4f4; font-size: 16px; }
-    .btn-primary { background: #dff0ff; }
-    .btn-danger { background: #ffdfe0; }
-    input[type="time"] { font-size: 18px; padding: 10px; border-radius: 12px; border: 1px solid #aaa; }
-    code { background: #f7f7f7; padding: 2px 6px; border-radius: 8px; }
-    .big { font-size: 20px; font-weight: 700; }
-    .muted { color: #555; }
-    .freq { font-size: 22px; font-weight: 800; letter-spacing: 0.5px; }
-  </style>
-</head>
-<body>
-  <div class="card">
-    <div class="big">Clock Radio Control</div>
-    <div class="muted">When alarm is ringing, Mute acts as Snooze (9 min, twice) then Dismiss.</div>
-    <div style="margin-top:8px;">
-      Current: <code id="cur">--:--</code> &nbsp; | &nbsp;
-      Alarm: <code id="alm">--:--</code> &nbsp; | &nbsp;
-      Armed (GP19): <code id="armed">?</code> &nbsp; | &nbsp;
-      Mute: <code id="mute">?</code>
-    </div>
-    <div style="margin-top:8px;">
-      Ringing: <code id="ring">?</code> &nbsp; | &nbsp;
-      Snoozes used: <code id="sz">?</code>
-    </div>
-    <div style="margin-top:10px;">
-      Station: <span class="freq" id="stn">--.-</span> <span class="muted">MHz</span>
-    </div>
-  </div>
-
-  <div class="card">
-    <div class="big">Radio</div>
-    <div class="row" style="margin-top:8px;">
-      <button id="muteBtn" class="btn btn-danger" onclick="hit('/mute_toggle')">Mute</button>
-      <button class="btn" onclick="hit('/station_down')">-0.1</button>
-      <button class="btn" onclick="hit('/station_up')">+0.1</button>
-    </div>
-  </div>
-
-  <div class="card">
-    <div class="big">Set Clock</div>
-    <div class="row" style="margin-top:8px;">
-      <input id="clockTime" type="time" step="60">
-      <button class="btn btn-primary" onclick="setClock()">Set Clock</button>
-      <button class="btn" onclick="hit('/clock_plus_hour')">+1 Hour</button>
-      <button class="btn" onclick="hit('/clock_plus_min')">+1 Minute</button>
-    </div>
-  </div>
-
-  <div class="card">
-    <div class="big">Set Alarm</div>
-    <div class="row" style="margin-top:8px;">
-      <input id="alarmTime" type="time" step="60">
-      <button class="btn btn-primary" onclick="setAlarm()">Set Alarm</button>
-      <button class="btn" onclick="hit('/alarm_plus_hour')">+1 Hour</button>
-      <button class="btn" onclick="hit('/alarm_plus_min')">+1 Minute</button>
-    </div>
-  </div>
-
-<script>
-function secToHHMM(s){
-  s = s % 86400;
-  const hh = String(Math.floor(s/3600)).padStart(2,'0');
-  const mm = String(Math.floor((s%3600)/60)).padStart(2,'0');
-  return hh + ":" + mm;
-}
-
-async function hit(path){
-  try { await fetch(path); } catch(e) {}
-  await refresh();
-}
-
-async function setClock(){
-  const t = document.getElementById('clockTime').value;
-  if(!t) return;
-  const [hh, mm] = t.split(':');
-  await hit(`/set_clock?hh=${hh}&mm=${mm}`);
-}
-
-async function setAlarm(){
-  const t = document.getElementById('alarmTime').value;
-  if(!t) return;
-  const [hh, mm] = t.split(':');
-  await hit(`/set_alarm?hh=${hh}&mm=${mm}`);
-}
-
-async function refresh(){
-  try{
-    const r = await fetch('/status');
-    const j = await r.json();
-
-    document.getElementById('cur').textContent = secToHHMM(j.current_seconds);
-    document.getElementById('alm').textContent = secToHHMM(j.alarm_seconds);
-    document.getElementById('armed').textContent = j.alarm_enabled ? "ON" : "OFF";
-
-    const muted = j.mute_state ? true : false;
-    document.getElementById('mute').textContent = muted ? "ON" : "OFF";
-    document.getElementById('muteBtn').textContent = muted ? "Unmute" : "Mute";
-
-    document.getElementById('ring').textContent = j.alarm_ringing ? "YES" : "NO";
-    document.getElementById('sz').textContent = String(j.snooze_count);
-
-    document.getElementById('stn').textContent = Number(j.station_mhz).toFixed(1);
-  } catch(e) {}
-}
-
-setInterval(refresh, 2000);
-refresh();
-</script>
-</body>
-</html>
-"""
-    return Response(request, html, content_type="text/html")
+    # Page lives in /index.html and is streamed from flash, so it never sits in the heap
+    return FileResponse(request, "index.html")
 
 # =========================================================
 # Web API Routes
 # =========================================================
 
+# /status JSON is rendered into this buffer instead of building a dict per request
+STATUS_BUF = bytearray(256)
+STATUS_VIEW = memoryview(STATUS_BUF)
+
+def put_bytes(buf, i, data):
+    """Copy data into buf at index i; return the index just past it."""
+    end = i + len(data)
+    buf[i:end] = data
+    return end
+
+def put_uint(buf, i, value):
+    """Write a non-negative int as ASCII decimal into buf at index i; return the index just past it."""
+    digits = 1
+    rest = value
+    while rest >= 10:
+        rest //= 10
+        digits += 1
+    end = i + digits
+    j = end
+    while j > i:
+        j -= 1
+        buf[j] = 48 + value % 10  # "0" + digit
+        value //= 10
+    return end
+
+def format_status(buf):
+    """Render the /status JSON object into buf; return its length."""
+    i = put_bytes(buf, 0, b'{"ip":"')
+    i = put_bytes(buf, i, IP_BYTES)
+    i = put_bytes(buf, i, b'","alarm_enabled":')
+    i = put_uint(buf, i, int(alarm_enabled))
+    i = put_bytes(buf, i, b',"current_seconds":')
+    i = put_uint(buf, i, get_current_seconds())
+    i = put_bytes(buf, i, b',"alarm_seconds":')
+    i = put_uint(buf, i, alarm_seconds)
+    i = put_bytes(buf, i, b',"mute_state":')
+    i = put_uint(buf, i, mute)
+    i = put_bytes(buf, i, b',"station_mhz":')
+    i = put_uint(buf, i, station // 10)
+    buf[i] = 46  # "."
+    buf[i + 1] = 48 + station % 10
+    i = put_bytes(buf, i + 2, b',"alarm_ringing":')
+    i = put_uint(buf, i, int(alarm_ringing))
+    i = put_bytes(buf, i, b',"snooze_count":')
+    i = put_uint(buf, i, snooze_count)
+    buf[i] = 125  # "}"
+    return i + 1
+
 @server.route("/status", methods=("GET",))
 def status(request: Request):
-    current = get_current_seconds()
-    return JSONResponse(request, {
-        "ip": str(wifi.radio.ipv4_address),
-        "alarm_enabled": int(sw_alarm_enable.value == 0),
-        "current_seconds": int(current),
-        "alarm_seconds": int(alarm_seconds),
-        "mute_state": int(mute),
-        "station_mhz": float(station),
-        "alarm_ringing": int(alarm_ringing),
-        "snooze_count": int(snooze_count),
-    })
+    n = format_status(STATUS_BUF)
+    return Response(request, STATUS_VIEW[:n], content_type=CT_JSON)
 
 @server.route("/mute_toggle", methods=("GET",))
 def route_mute_toggle(request: Request):
     handle_mute_press()
-    return Response(request, "OK", content_type="text/plain")
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/station_up", methods=("GET",))
 def route_station_up(request: Request):
-    step_station(+0.1)
-    return Response(request, "OK", content_type="text/plain")
+    step_station(+1)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/station_down", methods=("GET",))
 def route_station_down(request: Request):
-    step_station(-0.1)
-    return Response(request, "OK", content_type="text/plain")
+    step_station(-1)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/clock_plus_hour", methods=("GET",))
 def route_clock_plus_hour(request: Request):
-    increment_hour()
-    return Response(request, "OK", content_type="text/plain")
+    bump_time(False, 3600)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/clock_plus_min", methods=("GET",))
 def route_clock_plus_min(request: Request):
-    increment_minute()
-    return Response(request, "OK", content_type="text/plain")
+    bump_time(False, 60)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/alarm_plus_hour", methods=("GET",))
 def route_alarm_plus_hour(request: Request):
-    increment_alarm_hour()
-    return Response(request, "OK", content_type="text/plain")
+    bump_time(True, 3600)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/alarm_plus_min", methods=("GET",))
 def route_alarm_plus_min(request: Request):
-    increment_alarm_minute()
-    return Response(request, "OK", content_type="text/plain")
+    bump_time(True, 60)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
+
+def handle_set_time(request, setter):
+    """Parse hh/mm[/ss] from the query and pass them to set_clock or set_alarm."""
+    params = request.query_params
+    hh = params.get("hh")
+    mm = params.get("mm")
+    if hh is None or mm is None:
+        return Response(request, MSG_MISSING, content_type=CT_PLAIN, status=400)
+    try:
+        hh, mm, ss = int(hh), int(mm), int(params.get("ss", 0))
+    except ValueError:
+        return Response(request, MSG_BAD, content_type=CT_PLAIN, status=400)
+    setter(hh, mm, ss)
+    return Response(request, OK_BYTES, content_type=CT_PLAIN)
 
 @server.route("/set_clock", methods=("GET",))
 def route_set_clock(request: Request):
-    try:
-        hh = request.query_params.get("hh", None)
-        mm = request.query_params.get("mm", None)
-        ss = request.query_params.get("ss", 0)
-        if hh is None or mm is None:
-            return Response(request, "Missing hh or mm", content_type="text/plain", status=400)
-        set_clock(int(hh), int(mm), int(ss))
-        return Response(request, "OK", content_type="text/plain")
-    except Exception:
-        return Response(request, "Bad request", content_type="text/plain", status=400)
+    return handle_set_time(request, set_clock)
 
 @server.route("/set_alarm", methods=("GET",))
 def route_set_alarm(request: Request):
-    try:
-        hh = request.query_params.get("hh", None)
-        mm = request.query_params.get("mm", None)
-        ss = request.query_params.get("ss", 0)
-        if hh is None or mm is None:
-            return Response(request, "Missing hh or mm", content_type="text/plain", status=400)
-        set_alarm(int(hh), int(mm), int(ss))
-        return Response(request, "OK", content_type="text/plain")
-    except Exception:
-        return Response(request, "Bad request", content_type="text/plain", status=400)
+    return handle_set_time(request, set_alarm)
 
 # ----------------------------
 # Start server
 # ----------------------------
-server.start(str(wifi.radio.ipv4_address), port=80)
+server.start(IP_STR, port=80)
 print("Server started")
 
 # =========================================================
@@ -498,68 +432,72 @@ print("Server started")
 while True:
     server.poll()
 
-    # Current time and day rollover detection
-    cur = get_current_seconds()
-    if prev_current_seconds is None:
-        prev_current_seconds = cur
-    else:
-        # If time wrapped around to a smaller number -> new "day"
-        if cur < prev_current_seconds:
-            reset_daily_alarm_state()
-        prev_current_seconds = cur
-
-    # Alarm enabled state from switch
-    alarm_enabled = (sw_alarm_enable.value == 0)
-
-    # Turning alarm OFF cancels ringing/snooze immediately
-    if not alarm_enabled:
-        alarm_disable_reset()
-
-    # Brightness follows alarm enable switch
-    display.brightness = BRIGHT_ON if alarm_enabled else BRIGHT_DIM
-
     # ----------------------------
-    # Hardware buttons
+    # Hardware buttons (keypad events)
     # ----------------------------
-    if but_mute.value == 0:
-        handle_mute_press()
-        time.sleep(0.25)  # debounce
-
-    if stn_up.value == 0:
-        step_station(+0.1)
-        time.sleep(0.25)
-
-    if stn_down.value == 0:
-        step_station(-0.1)
-        time.sleep(0.25)
-
-    # Clock/Alarm adjustment buttons depend on sw_alarm mode
-    if sw_alarm.value == 0:
-        if but_hours.value == 0:
-            increment_alarm_hour()
-        if but_mins.value == 0:
-            increment_alarm_minute()
-    else:
-        if but_hours.value == 0:
-            increment_hour()
-        if but_mins.value == 0:
-            increment_minute()
+    while (event := keys.events.get()):
+        key = event.key_number
+
+        # Switches: follow the level (keypad reports a press for a switch already ON at startup)
+        if key == KEY_SW_ALARM:
+            alarm_set_mode = event.pressed
+            next_tick_ns = 0  # redraw in the new mode
+            continue
+        if key == KEY_SW_ENABLE:
+            alarm_enabled = event.pressed
+            # Turning alarm OFF cancels ringing/snooze immediately
+            if not alarm_enabled:
+                alarm_disable_reset()
+            # Brightness follows alarm enable switch
+            display.brightness = BRIGHT_ON if alarm_enabled else BRIGHT_DIM
+            continue
+
+        if not event.pressed:
+            continue
+        if key == KEY_MUTE:
+            handle_mute_press()
+        elif key == KEY_STN_UP:
+            step_station(+1)
+        elif key == KEY_STN_DOWN:
+            step_station(-1)
+        # Clock/Alarm adjustment buttons depend on the GP18 switch
+        elif key == KEY_HOURS:
+            bump_time(alarm_set_mode, 3600)
+            next_tick_ns = 0  # show the new time right away
+        elif key == KEY_MINS:
+            bump_time(alarm_set_mode, 60)
+            next_tick_ns = 0
+
+    # Short yield between passes; none while ringing so mute/snooze answer at once
+    if not alarm_ringing:
+        time.sleep(IDLE_SLEEP)
+
+    # Everything below runs on the housekeeping tick, not every pass
+    now_ns = time.monotonic_ns()
+    if now_ns < next_tick_ns:
+        continue
+    next_tick_ns = now_ns + TICK_NS
+
+    # Current time and day rollover detection
+    elapsed_s = (now_ns - clock_epoch_ns) // NS_PER_S
+    cur = elapsed_s % 86400
+    day = elapsed_s // 86400
+    if day != last_day:
+        reset_daily_alarm_state()
+        last_day = day
 
     # ----------------------------
     # Alarm + Snooze Logic (NEW)
     # ----------------------------
     if alarm_enabled and not alarm_done_for_day:
-        cur_min = cur // 60
-        alarm_min = alarm_seconds // 60
-
         # Fire initial alarm once per day
-        if (not initial_fired_today) and (cur_min == alarm_min):
+        if (not initial_fired_today) and ring_due(cur, alarm_seconds):
             initial_fired_today = True
             snooze_target = None
             start_alarm_ring()
 
         # Fire snoozed alarm (if scheduled)
-        if (snooze_target is not None) and (cur_min == (snooze_target // 60)):
+        if (snooze_target is not None) and ring_due(cur, snooze_target):
             snooze_target = None  # consume this target
             start_alarm_ring()
 
@@ -567,5 +505,4 @@ while True:
     # (initial_fired_today will still be False until it rings or day rolls over)
 
     update_clock()
-    time.sleep(0.5)
 